@@ -1,9 +1,18 @@
 from dataclasses import dataclass, field
-from typing import Iterable, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from functools import cached_property, lru_cache
+from typing import Iterable, List, Optional, Tuple
+import hashlib
+import json
 import os
-import subprocess
-import yaml 
 import re
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+from weakref import WeakValueDictionary
 from snakemake_interface_software_deployment_plugins.settings import (
     SoftwareDeploymentSettingsBase,
 )
@@ -15,7 +24,7 @@ from snakemake_interface_software_deployment_plugins import (
     SoftwareReport,
 )
 
-from snakemake_interface_common.exceptions import WorkflowError  # noqa: F401
+from snakemake_interface_common.exceptions import WorkflowError
 
 
 """
@@ -35,6 +44,202 @@ from snakemake_interface_common.exceptions import WorkflowError  # noqa: F401
             - Shouldn't be too hard, but it's better to first make sure everything is working fine.
 """
 
+# Resolved once at import; check() fails if it is unset.
+_SPACK_ROOT = os.environ.get("SPACK_ROOT")
+_spack_checked = False
+
+# Valid spack environment names, as in spack's own check (rejects "." and "..").
+_ENV_NAME_RE = re.compile(r"\w[\w-]*")
+
+# Characters that require a command to be interpreted by the shell.
+_SHELL_METACHARS = frozenset("|&;<>()$`\\\"'*?[]{}#~=%!\n")
+
+# Commands that have to run within the shell: builtins and keywords of
+# POSIX sh and bash, and spack, which setup-env.sh defines as a shell function.
+_SHELL_BUILTINS = frozenset(
+    """
+    . : [ alias bg bind break builtin caller case cd command compgen complete
+    compopt continue coproc declare dirs disown echo enable eval exec exit export
+    false fc fg for function getopts hash help history if jobs kill let local
+    logout mapfile popd printf pushd pwd read readarray readonly return select
+    set shift shopt source suspend test time times trap true type typeset ulimit
+    umask unalias unset until wait while spack
+    """.split()
+)
+
+
+@lru_cache(maxsize=4096)
+def _parse_spec(spec: str) -> Optional[Tuple[str, str]]:
+    # Split a "name@version..." spec into name and the leading numeric version.
+    # Returns None for specs without a name@version prefix.
+    # Memoized, and names are interned, as many envs share the same packages.
+    name, sep, rest = spec.partition("@")
+    if not sep or not name or "^" in name:
+        return None
+    end = 0
+    for c in rest:
+        if not (c.isdecimal() or c == "."):
+            break
+        end += 1
+    if not end:
+        return None
+    return sys.intern(name), rest[:end]
+
+
+def _read_file(path: bytes) -> bytes:
+    # Read a whole (small) file with raw os calls, sized via fstat, bypassing
+    # the buffering layer of Python file objects.
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        data = os.read(fd, os.fstat(fd).st_size or 1)
+        while chunk := os.read(fd, 65536):
+            data += chunk
+    finally:
+        os.close(fd)
+    return data
+
+
+def _load_yaml(data: bytes):
+    # PyYAML is only needed for spack.yaml files _extract_specs cannot handle,
+    # so it is imported lazily. Prefer the libyaml based C loader.
+    import yaml
+
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    return yaml.load(data, Loader=loader)
+
+
+def _strip_comment(value: str) -> str:
+    return value.split(" #", 1)[0].rstrip()
+
+
+def _scalar(value: str) -> Optional[str]:
+    # Return the string value of a single-line YAML scalar, or None if it uses
+    # syntax that needs the full YAML parser.
+    if value[:1] in ("'", '"'):
+        end = value.find(value[0], 1)
+        if end == -1 or _strip_comment(value[end + 1 :]):
+            return None
+        if "\\" in value[:end] or value[end + 1 : end + 2] == value[0]:
+            # escape sequences
+            return None
+        return value[1:end]
+    value = _strip_comment(value)
+    if (
+        not value
+        or value[0] in "[]{}&*!|>%@`,?#-"
+        or ": " in value
+        or value.endswith(":")
+    ):
+        return None
+    return value
+
+
+def _extract_specs(text: str) -> Optional[List[str]]:
+    # Specialized parser for the common layout of a spack.yaml: a top-level
+    # spack: mapping with a block list of single-line strings under specs:.
+    # Returns None if the file deviates from that (flow syntax, anchors,
+    # multi-line scalars, ...), in which case the full YAML parser is needed.
+    if "\t" in text or "<<" in text or text.startswith(("---", "%", "\ufeff")):
+        return None
+    specs = None
+    in_spack = in_specs = False
+    key_indent = item_indent = None
+    for line in text.splitlines():
+        stripped = line.lstrip(" ")
+        if not stripped or stripped.startswith("#"):
+            continue
+        indent = len(line) - len(stripped)
+        if indent == 0:
+            if in_spack:
+                break
+            in_spack = _strip_comment(stripped) == "spack:"
+            continue
+        if not in_spack:
+            continue
+        if key_indent is None:
+            key_indent = indent
+        if in_specs:
+            if item_indent is None and stripped.startswith("-"):
+                item_indent = indent
+            if indent == item_indent and stripped.startswith("-"):
+                spec = _scalar(stripped[1:].lstrip(" "))
+                if spec is None or not stripped[1:2] == " ":
+                    return None
+                specs.append(spec)
+                continue
+            if indent > key_indent:
+                return None
+            in_specs = False
+        if indent < key_indent:
+            return None
+        if indent == key_indent and not stripped.startswith("-"):
+            # only plain "key: value" entries are expected here
+            entry = _strip_comment(stripped)
+            if entry[0] in "[]{}&*!|>%@`,?#" or not (
+                entry.endswith(":") or ": " in entry
+            ):
+                return None
+        if indent == key_indent and stripped.split(":", 1)[0].strip(" '\"") == "specs":
+            if specs is not None or _strip_comment(stripped) != "specs:":
+                return None
+            specs = []
+            in_specs = True
+    return specs
+
+
+def _specs_from_yaml(data: bytes, path: bytes) -> List[str]:
+    specs = _extract_specs(data.decode("utf-8"))
+    if specs is None:
+        specs = _specs_from_sidecar(data, path)
+    return [spec for spec in specs if isinstance(spec, str)]
+
+
+def _specs_from_sidecar(data: bytes, path: bytes) -> list:
+    # Files that need the full YAML parser get their specs cached in a JSON
+    # sidecar next to them (.spack.yaml.specs.json), keyed by the digest of
+    # the yaml content, so that other processes can skip parsing it.
+    digest = hashlib.md5(data, usedforsecurity=False).hexdigest()
+    head, tail = os.path.split(path)
+    sidecar = os.path.join(head, b"." + tail + b".specs.json")
+    try:
+        cached = json.loads(_read_file(sidecar))
+        if cached["digest"] == digest and isinstance(cached["specs"], list):
+            return cached["specs"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    env_data = _load_yaml(data) or {}
+    specs = (env_data.get("spack") or {}).get("specs") or []
+    try:
+        # A unique temporary file per writer, as several threads or processes
+        # may write the same sidecar concurrently.
+        fd, tmp = tempfile.mkstemp(dir=head, prefix=b"." + tail + b".", suffix=b".tmp")
+    except OSError:
+        # e.g. a read-only spack installation, the cache is optional
+        return specs
+    try:
+        # mkstemp creates the file readable by the owner only
+        os.fchmod(fd, 0o644)
+        with os.fdopen(fd, "w") as f:
+            json.dump(
+                {"digest": digest, "specs": [s for s in specs if isinstance(s, str)]},
+                f,
+            )
+        os.replace(tmp, sidecar)
+    except OSError:
+        with suppress(OSError):
+            os.unlink(tmp)
+    return specs
+
+
+def _load_env_yaml(
+    path: bytes, data: Optional[bytes] = None
+) -> Tuple[bytes, List[str]]:
+    # The file is only read if its content is not given (i.e. not yet cached).
+    if data is None:
+        data = _read_file(path)
+    return data, _specs_from_yaml(data, path)
+
+
 @dataclass
 class SoftwareDeploymentSettings(SoftwareDeploymentSettingsBase):
     pack_parameter: Optional[int] = field(
@@ -68,8 +273,8 @@ class EnvSpec(EnvSpecBase):
     envName: Optional[str] = None
 
     def __post_init__(self):
-        if (self.envName is None):
-            raise WorkflowError("Exactly one of envName must be set.")
+        if not isinstance(self.envName, str) or not self.envName:
+            raise WorkflowError("envName must be set to a spack environment name.")
 
     @classmethod
     def identity_attributes(cls) -> Iterable[str]:
@@ -91,20 +296,78 @@ class Env(EnvBase, DeployableEnvBase, ArchiveableEnvBase):
     # method. Instead, use __post_init__ to set additional attributes and initialize
     # futher stuff.
 
-    def run_cmd(self, cmd: str) -> subprocess.CompletedProcess:
-        process = subprocess.run(cmd, shell=True, check=True)
-        return process.stdout
+    _yaml_owners: "WeakValueDictionary[str, Env]" = WeakValueDictionary()
+
+    def run_cmd(self, cmd: str, **kwargs) -> subprocess.CompletedProcess:
+        # Commands without shell syntax are executed directly, saving the
+        # shell process. Anything else (or a command that has to be decorated
+        # by a parent environment) still goes through the shell.
+        # Shell builtins and functions (like the spack shell function from
+        # setup-env.sh) only exist within the shell and are never exec'd.
+        kwargs.setdefault("check", True)
+        if self.within is None and not _SHELL_METACHARS.intersection(cmd):
+            argv = shlex.split(cmd)
+            if (
+                argv
+                and argv[0] not in _SHELL_BUILTINS
+                and shutil.which(argv[0]) is not None
+            ):
+                try:
+                    return subprocess.run(argv, **kwargs)
+                except FileNotFoundError:
+                    pass
+        return super().run_cmd(cmd, **kwargs)
 
 
     def __post_init__(self) -> None:
         # This is optional and can be removed if not needed.
         # Alternatively, you can e.g. prepare anything or set additional attributes.
         self.check()
+        # The env name ends up in shell commands, so it is validated once here
+        # and the activation prefix is built once for all decorated commands.
+        if not _ENV_NAME_RE.fullmatch(self.spec.envName):
+            raise WorkflowError(
+                f"Invalid spack environment name {self.spec.envName!r}: it must "
+                "start with a letter, digit or '_', followed by letters, digits, "
+                "'_' or '-'."
+            )
+        self._activate_prefix = f"spack env activate {self.spec.envName} && "
+        #$SPACK_ROOT/var/spack/environments/myenv/spack.yaml
+        # Kept pre-encoded so that open() does not re-encode it on every read.
+        self._env_yaml_path_bytes = os.fsencode(
+            os.path.join(
+                _SPACK_ROOT, "var/spack/environments", self.spec.envName, "spack.yaml"
+            )
+        )
+        self._env_yaml_path = os.fsdecode(self._env_yaml_path_bytes)
+        # Envs with the same name share one loaded spack.yaml: the first of
+        # them reads and parses it, the others delegate to it.
+        self._yaml_owner = Env._yaml_owners.setdefault(self.spec.envName, self)
 
     def get_spack_env_yaml(self):
-        #$SPACK_ROOT/var/spack/environments/myenv/spack.yaml
-        SPACK_ROOT = os.environ.get("SPACK_ROOT")
-        return f"{SPACK_ROOT}/var/spack/environments/{self.spec.envName}/spack.yaml"
+        return self._env_yaml_path
+
+    # The spack.yaml is read and parsed at most once per Env instance.
+    @cached_property
+    def _env_yaml_bytes(self) -> bytes:
+        if self._yaml_owner is not self:
+            return self._yaml_owner._env_yaml_bytes
+        try:
+            return _read_file(self._env_yaml_path_bytes)
+        except FileNotFoundError as e:
+            raise self._env_yaml_missing() from e
+
+    def _env_yaml_missing(self) -> WorkflowError:
+        return WorkflowError(
+            f"Spack environment {self.spec.envName} not found: "
+            f"{self._env_yaml_path} does not exist."
+        )
+
+    @cached_property
+    def _env_specs(self) -> List[str]:
+        if self._yaml_owner is not self:
+            return self._yaml_owner._env_specs
+        return _specs_from_yaml(self._env_yaml_bytes, self._env_yaml_path_bytes)
 
     # The decorator ensures that the decorated method is only called once
     # in case multiple environments of the same kind are created.
@@ -112,35 +375,77 @@ class Env(EnvBase, DeployableEnvBase, ArchiveableEnvBase):
     def check(self) -> None:
         # Check e.g. whether the required software is available (e.g. a container
         # runtime or a module command).
-        ...
+        # The spack installation is the same for all envs, so it is checked only
+        # once per process regardless of the "within" environment.
+        global _spack_checked
+        if _spack_checked:
+            return
+        if _SPACK_ROOT is None:
+            raise WorkflowError(
+                "SPACK_ROOT is not set. Make sure spack is installed and its "
+                "environment has been sourced (e.g. share/spack/setup-env.sh)."
+            )
+        if not os.path.isdir(_SPACK_ROOT):
+            raise WorkflowError(
+                f"SPACK_ROOT ({_SPACK_ROOT}) is not an accessible directory."
+            )
+        _spack_checked = True
 
     def decorate_shellcmd(self, cmd: str) -> str:
-        return f"spack env activate {self.spec.envName} && {cmd}"
+        return self._activate_prefix + cmd
 
     def record_hash(self, hash_object) -> None:
-        env_yaml = self.get_spack_env_yaml()
-        with open(env_yaml, "r") as f:
-            hash_object.update(f.read().encode("utf-8"))
+        # Hash the raw file bytes; no decode/encode round-trip needed.
+        hash_object.update(self._env_yaml_bytes)
 
     def report_software(self) -> Iterable[SoftwareReport]:
-        env_yaml = self.get_spack_env_yaml()
-        with open(env_yaml, "r") as f:
-            env_data = yaml.safe_load(f)
-        pattern = re.compile(r"^([^@^]+)@([\d\.]+)")
-        result = []
-        
-        for spec in env_data.get("spack", {}).get("specs", []):
-            match = pattern.match(spec)
-            if match:
-                name, version = match.groups()
-                result.append(
-                    SoftwareReport(
-                        name=name,
-                        version=version
-                    )
+        for spec in self._env_specs:
+            parsed = _parse_spec(spec)
+            if parsed:
+                name, version = parsed
+                yield SoftwareReport(
+                    name=name,
+                    version=version
                 )
-        
-        return result
+
+    @classmethod
+    def bulk_report(cls, envs: Iterable["Env"]) -> List[List[SoftwareReport]]:
+        """Report the software of many environments at once, returning one list
+        of reports per given env (in the same order).
+
+        The spack.yaml files are read and parsed in parallel threads and the
+        results are cached on the envs, like report_software() would do.
+        """
+        envs = list(envs)
+        pending = list(
+            {
+                id(env._yaml_owner): env._yaml_owner
+                for env in envs
+                if "_env_specs" not in env._yaml_owner.__dict__
+            }.values()
+        )
+        if pending:
+            # The worker threads only do the I/O and parsing. Their results are
+            # assigned to __dict__ in this thread, so that the workers never
+            # touch the cached properties.
+            with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+                futures = [
+                    executor.submit(
+                        _load_env_yaml,
+                        env._env_yaml_path_bytes,
+                        env.__dict__.get("_env_yaml_bytes"),
+                    )
+                    for env in pending
+                ]
+                for env, future in zip(pending, futures):
+                    try:
+                        data, specs = future.result()
+                    except FileNotFoundError as e:
+                        raise env._env_yaml_missing() from e
+                    env.__dict__["_env_yaml_bytes"] = data
+                    env.__dict__["_env_specs"] = specs
+        return [list(env.report_software()) for env in envs]
+
     # The methods below are optional. Remove them if not needed and adjust the
     # base classes above.
 
@@ -0,0 +1,141 @@
+from weakref import WeakValueDictionary
+
+import pytest
+from snakemake_interface_common.exceptions import WorkflowError
+from snakemake_interface_software_deployment_plugins import EnvBase
+
+import snakemake_software_deployment_plugin_spack as plugin
+from snakemake_software_deployment_plugin_spack import Env, EnvSpec
+
+
+class ConcreteEnv(Env):
+    # Env leaves the deployment and archive methods unimplemented.
+    async def deploy(self) -> None: ...
+
+    def is_deployment_path_portable(self) -> bool:
+        return False
+
+    def remove(self) -> None: ...
+
+    async def archive(self) -> None: ...
+
+
+@pytest.fixture
+def spack_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(plugin, "_SPACK_ROOT", str(tmp_path))
+    monkeypatch.setattr(plugin, "_spack_checked", False)
+    monkeypatch.setattr(Env, "_yaml_owners", WeakValueDictionary())
+    monkeypatch.setattr(EnvBase, "_cache", {})
+    return tmp_path
+
+
+def write_env(spack_root, name, content):
+    env_dir = spack_root / "var/spack/environments" / name
+    env_dir.mkdir(parents=True, exist_ok=True)
+    (env_dir / "spack.yaml").write_text(content)
+    return env_dir
+
+
+def make_env(name, within=None):
+    return ConcreteEnv(EnvSpec(envName=name), within, None, "bash")
+
+
+@pytest.mark.parametrize(
+    "cmd", ["cd /tmp", "source /dev/null", "exit 0", ": noop", "true"]
+)
+def test_run_cmd_shell_builtin(spack_root, cmd):
+    assert make_env("e1").run_cmd(cmd).returncode == 0
+
+
+def test_run_cmd_direct(spack_root):
+    process = make_env("e1").run_cmd("ls /")
+    assert process.args == ["ls", "/"]
+
+
+def test_run_cmd_shell_syntax(spack_root):
+    process = make_env("e1").run_cmd("ls / | cat")
+    assert process.args == "ls / | cat"
+
+
+def test_bulk_report(spack_root, monkeypatch):
+    write_env(spack_root, "e1", "spack:\n  specs:\n  - gcc@12.1.0\n  - zlib@1.3\n")
+    write_env(spack_root, "e2", "spack:\n  specs: [hdf5@1.10+mpi]\n")
+    envs = [make_env("e2"), make_env("e1"), make_env("e2")]
+
+    loaded = []
+    load_env_yaml = plugin._load_env_yaml
+
+    def counting_load_env_yaml(path, data=None):
+        loaded.append(path)
+        return load_env_yaml(path, data)
+
+    monkeypatch.setattr(plugin, "_load_env_yaml", counting_load_env_yaml)
+    reports = Env.bulk_report(envs)
+
+    # envs with the same name are loaded once
+    assert len(loaded) == 2
+    assert [[r.name for r in report] for report in reports] == [
+        ["hdf5"],
+        ["gcc", "zlib"],
+        ["hdf5"],
+    ]
+    assert reports == [list(env.report_software()) for env in envs]
+
+
+def test_bulk_report_uses_cached_bytes(spack_root):
+    env_dir = write_env(spack_root, "e1", "spack:\n  specs:\n  - gcc@12.1.0\n")
+    env = make_env("e1")
+    cached = env._env_yaml_bytes
+    (env_dir / "spack.yaml").write_text("spack:\n  specs:\n  - zlib@1.3\n")
+
+    # the specs are parsed from the bytes that record_hash uses
+    (report,) = Env.bulk_report([env])
+    assert [r.name for r in report] == ["gcc"]
+    assert env._env_yaml_bytes is cached
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"envName": None}, {"envName": ""}])
+def test_env_spec_requires_name(kwargs):
+    with pytest.raises(WorkflowError):
+        EnvSpec(**kwargs)
+
+
+@pytest.mark.parametrize("name", ["e1; rm -rf /", "..", ".", "-e1", "e1.x", "e1\n"])
+def test_env_invalid_name(spack_root, name):
+    with pytest.raises(WorkflowError):
+        make_env(name)
+
+
+def test_env_yaml_missing(spack_root):
+    env = make_env("missing")
+    with pytest.raises(WorkflowError, match="missing.*spack.yaml does not exist"):
+        env.hash()
+    with pytest.raises(WorkflowError, match="missing"):
+        list(env.report_software())
+    with pytest.raises(WorkflowError, match="missing"):
+        Env.bulk_report([make_env("missing")])
+
+
+def test_check_spack_root_unset(spack_root, monkeypatch):
+    monkeypatch.setattr(plugin, "_SPACK_ROOT", None)
+    with pytest.raises(WorkflowError, match="SPACK_ROOT is not set"):
+        make_env("e1")
+
+
+def test_check_spack_root_not_a_directory(spack_root, monkeypatch):
+    not_a_dir = spack_root / "file"
+    not_a_dir.write_text("")
+    monkeypatch.setattr(plugin, "_SPACK_ROOT", str(not_a_dir))
+    with pytest.raises(WorkflowError, match="not an accessible directory"):
+        make_env("e1")
+
+
+def test_check_once_per_process(spack_root, monkeypatch):
+    write_env(spack_root, "e1", "spack:\n  specs:\n  - gcc@12.1.0\n")
+    parent = make_env("e1")
+    assert plugin._spack_checked
+    # later envs, also within other envs, do not check again
+    monkeypatch.setattr(plugin, "_SPACK_ROOT", str(spack_root / "missing"))
+    monkeypatch.setattr(EnvBase, "_cache", {})
+    make_env("e2")
+    make_env("e3", within=parent)
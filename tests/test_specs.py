@@ -0,0 +1,187 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import yaml
+
+import snakemake_software_deployment_plugin_spack as plugin
+from snakemake_software_deployment_plugin_spack import (
+    _extract_specs,
+    _parse_spec,
+    _specs_from_sidecar,
+)
+
+
+@pytest.mark.parametrize(
+    "spec,expected",
+    [
+        ("gcc@12.1.0", ("gcc", "12.1.0")),
+        ("hdf5@1.10+mpi", ("hdf5", "1.10")),
+        ("py-numpy@1.24 ^python@3.11", ("py-numpy", "1.24")),
+        ("openmpi@4.1:4.2", ("openmpi", "4.1")),
+        ("zlib@1.3 %gcc@12", ("zlib", "1.3")),
+        # dependency constraint before the version
+        ("py-numpy^python@3.11", None),
+        ("zlib", None),
+        ("zlib@", None),
+        ("zlib@develop", None),
+        ("@1.0", None),
+        # only decimal digits, like \d in the former regex
+        ("gcc@12\u00b2", ("gcc", "12")),
+    ],
+)
+def test_parse_spec(spec, expected):
+    assert _parse_spec(spec) == expected
+
+
+def yaml_specs(text):
+    return yaml.safe_load(text)["spack"]["specs"]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        # standard layout written by spack, dashes at key indent
+        "spack:\n"
+        "  # add package specs to the `specs` list\n"
+        "  specs:\n"
+        "  - gcc@12.1.0\n"
+        "  - py-numpy@1.24 ^python@3.11\n"
+        "  view: true\n"
+        "  concretizer:\n"
+        "    unify: true\n",
+        # indented dashes
+        "spack:\n  specs:\n    - gcc@12.1.0\n    - zlib\n  view: true\n",
+        # comments, plain and quoted
+        "spack: # env\n"
+        "  specs: # pinned\n"
+        "  # - commented@1\n"
+        "  - gcc@12 # compiler\n"
+        "  - 'hdf5@1.10+mpi' # quoted\n"
+        '  - "zlib@1.3 # not a comment"\n'
+        "  - 'a#b'\n",
+        # CRLF line endings
+        "spack:\r\n  specs:\r\n  - gcc@12.1.0\r\n  - zlib@1.3\r\n  view: true\r\n",
+        # a block scalar containing specs: is not the specs key
+        "spack:\n  description: |\n    specs:\n    - fake@0\n  specs:\n  - real@1\n",
+        # other top-level keys around spack
+        "other: 1\nspack:\n  specs:\n  - gcc@12\nafter:\n  - x\n",
+    ],
+)
+def test_extract_specs(text):
+    assert _extract_specs(text) == yaml_specs(text)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        # flow list
+        "spack:\n  specs: [gcc@12, zlib]\n",
+        # document marker
+        "---\nspack:\n  specs:\n  - gcc@12\n",
+        # anchors and aliases
+        "spack:\n  specs:\n  - &compiler gcc@12\n  - *compiler\n",
+        "spack:\n  definitions:\n  - pkgs: &pkgs [zlib]\n  specs: *pkgs\n",
+        # multi-line plain scalar
+        "spack:\n  specs:\n  - gcc\n    @12\n",
+        # escapes in quoted scalars
+        'spack:\n  specs:\n  - "gcc\\t@12"\n',
+        "spack:\n  specs:\n  - 'it''s@1'\n",
+    ],
+)
+def test_extract_specs_fallback(text):
+    # the full YAML parser has to handle these
+    yaml_specs(text)
+    assert _extract_specs(text) is None
+
+
+FLOW_YAML = b"spack:\n  specs: [gcc@12.1.0, zlib@1.3]\n"
+
+
+@pytest.fixture
+def env_yaml(tmp_path):
+    path = tmp_path / "spack.yaml"
+    path.write_bytes(FLOW_YAML)
+    return path
+
+
+def sidecar(env_yaml):
+    return env_yaml.parent / ".spack.yaml.specs.json"
+
+
+def test_sidecar_written(env_yaml):
+    specs = _specs_from_sidecar(FLOW_YAML, bytes(env_yaml))
+    assert specs == ["gcc@12.1.0", "zlib@1.3"]
+    assert json.loads(sidecar(env_yaml).read_text())["specs"] == specs
+
+
+def test_sidecar_hit(env_yaml):
+    _specs_from_sidecar(FLOW_YAML, bytes(env_yaml))
+    cached = json.loads(sidecar(env_yaml).read_text())
+    cached["specs"] = ["from-sidecar@1"]
+    sidecar(env_yaml).write_text(json.dumps(cached))
+    assert _specs_from_sidecar(FLOW_YAML, bytes(env_yaml)) == ["from-sidecar@1"]
+
+
+def test_sidecar_stale(env_yaml):
+    _specs_from_sidecar(FLOW_YAML, bytes(env_yaml))
+    changed = b"spack:\n  specs: [hdf5@1.10]\n"
+    env_yaml.write_bytes(changed)
+    assert _specs_from_sidecar(changed, bytes(env_yaml)) == ["hdf5@1.10"]
+    assert json.loads(sidecar(env_yaml).read_text())["specs"] == ["hdf5@1.10"]
+
+
+@pytest.mark.parametrize("content", ["{not json", "[]", '{"digest": 1}'])
+def test_sidecar_corrupt(env_yaml, content):
+    sidecar(env_yaml).write_text(content)
+    assert _specs_from_sidecar(FLOW_YAML, bytes(env_yaml)) == [
+        "gcc@12.1.0",
+        "zlib@1.3",
+    ]
+    assert json.loads(sidecar(env_yaml).read_text())["specs"] == [
+        "gcc@12.1.0",
+        "zlib@1.3",
+    ]
+
+
+def test_sidecar_replace_fails(env_yaml, monkeypatch):
+    def replace(src, dst):
+        raise PermissionError(dst)
+
+    monkeypatch.setattr(plugin.os, "replace", replace)
+    assert _specs_from_sidecar(FLOW_YAML, bytes(env_yaml)) == [
+        "gcc@12.1.0",
+        "zlib@1.3",
+    ]
+    # no sidecar and no temporary file are left behind
+    assert os.listdir(env_yaml.parent) == ["spack.yaml"]
+
+
+@pytest.mark.skipif(os.geteuid() == 0, reason="root can write to read-only dirs")
+def test_sidecar_read_only_dir(env_yaml):
+    env_yaml.parent.chmod(0o555)
+    try:
+        assert _specs_from_sidecar(FLOW_YAML, bytes(env_yaml)) == [
+            "gcc@12.1.0",
+            "zlib@1.3",
+        ]
+        assert os.listdir(env_yaml.parent) == ["spack.yaml"]
+    finally:
+        env_yaml.parent.chmod(0o755)
+
+
+def test_sidecar_concurrent_writers(env_yaml):
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(
+            executor.map(
+                lambda _: _specs_from_sidecar(FLOW_YAML, bytes(env_yaml)), range(32)
+            )
+        )
+    assert all(specs == ["gcc@12.1.0", "zlib@1.3"] for specs in results)
+    assert json.loads(sidecar(env_yaml).read_text())["specs"] == results[0]
+    # no temporary files are left behind
+    assert sorted(os.listdir(env_yaml.parent)) == [
+        ".spack.yaml.specs.json",
+        "spack.yaml",
+    ]